@@ -1,3 +1,6 @@
+import csv
+import functools
+import io
 import re
 import unicodedata
 import pandas as pd
@@ -12,6 +15,21 @@ logger = get_logger("EXTRACT")
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
 
+# Patrones precompilados: se evalúan una vez por celda/columna, así evitamos
+# la búsqueda en el cache interno de `re` en cada llamada
+_INT_RE = re.compile(r"-?\d+")
+_FLOAT_RE = re.compile(r"-?\d+\.\d+")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_UNDERSCORES_RE = re.compile(r"_+")
+
+# Tabla de plegado de acentos para los nombres de columna en español:
+# una sola pasada C con str.translate en lugar de NFKD + encode/decode
+_ACCENT_TABLE = str.maketrans(
+    "áéíóúüñàèìòùâêîôûäëïöÁÉÍÓÚÜÑÀÈÌÒÙÂÊÎÔÛÄËÏÖ",
+    "aeiouunaeiouaeiouaeioAEIOUUNAEIOUAEIOUAEIO",
+)
+
+@functools.lru_cache(maxsize=1)
 def get_gspread_client():
     credentials = Credentials.from_service_account_info(
         json.loads(os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")),
@@ -19,29 +37,74 @@ def get_gspread_client():
     )
     return gspread.authorize(credentials)
 
-def get_records_with_header(ws, header_row=2):
-    """
-    Lee una hoja de Google Sheets usando una fila específica como cabecera
-    """
-    values = ws.get_all_values()
+@functools.lru_cache(maxsize=4)
+def _open_book(sheet_id):
+    """Memoiza el handle del spreadsheet: varias extracciones sobre el mismo
+    libro comparten la autorización y los RTTs de metadata de la API."""
+    return get_gspread_client().open_by_key(sheet_id)
+
+def _df_from_rows(headers, data):
+    """Construye el DataFrame columna a columna (una sola asignación de
+    bloques) en lugar de fila a fila, que fragmenta el block manager en
+    hojas anchas. Si hay cabeceras duplicadas se usa el constructor por
+    filas, que sí las preserva."""
+    if len(set(headers)) == len(headers):
+        return pd.DataFrame({
+            h: [r[i] if i < len(r) else "" for r in data]
+            for i, h in enumerate(headers)
+        })
+    return pd.DataFrame(data, columns=headers)
+
 
+def _df_from_values(values, header_row=2):
+    """Construye un DataFrame desde una lista de filas ya descargada,
+    usando una fila específica como cabecera"""
     if len(values) < header_row:
         raise ValueError("La hoja no tiene suficientes filas para usar como cabecera")
 
     headers = values[header_row - 1]
     data = values[header_row:]
 
-    return pd.DataFrame(data, columns=headers)
+    return _df_from_rows(headers, data)
+
+
+def get_records_with_header(ws, header_row=2):
+    """
+    Lee una hoja de Google Sheets usando una fila específica como cabecera
+    """
+    return _df_from_values(ws.get_all_values(), header_row=header_row)
 
 
 def get_all_records_robust(ws):
-    """Leer toda la hoja y construir registros robustos.
+    """Leer toda la hoja y construir registros robustos."""
+    return _records_from_values(ws.get_all_values())
+
+
+def _coerce_cell_strings(stripped):
+    """Aplica el contrato de coerción por celda sobre una Serie de strings ya
+    stripeados: vacío->None y conversión a int/float solo donde el patrón
+    calza; todo lo demás se conserva como string."""
+    out = stripped.astype(object)
+    out.loc[stripped.isna() | (stripped == "")] = None
+
+    mask_int = stripped.str.fullmatch(_INT_RE).fillna(False)
+    if mask_int.any():
+        out.loc[mask_int] = stripped[mask_int].map(int)
+
+    mask_float = stripped.str.fullmatch(_FLOAT_RE).fillna(False)
+    if mask_float.any():
+        out.loc[mask_float] = stripped[mask_float].map(float)
+
+    return out
+
+
+def _records_from_values(values):
+    """Construir registros robustos desde filas ya descargadas.
     - Detecta la primera fila no vacía como encabezado.
     - Rellena encabezados vacíos con `col_{i}` y asegura nombres únicos.
     - Convierte cadenas numéricas a int/float para preservar seriales de fecha.
     - Omite filas completamente vacías.
     """
-    values = ws.get_all_values()
     if not values:
         return []
 
@@ -62,55 +125,78 @@ def get_all_records_robust(ws):
         headers.append(name)
 
     data_rows = values[header_idx + 1 :]
-    records = []
+    if not data_rows:
+        return []
+
     num_cols = len(headers)
 
-    for row in data_rows:
-        # asegurar longitud
-        row_extended = list(row) + [""] * max(0, num_cols - len(row))
-        rec = {}
-        for i, cell in enumerate(row_extended[:num_cols]):
-            if cell is None:
-                rec[headers[i]] = None
-                continue
-            s = str(cell).strip()
-            if s == "":
-                rec[headers[i]] = None
-                continue
-
-            # intentar convertir a número (int o float)
-            if re.fullmatch(r"-?\d+", s):
-                try:
-                    rec[headers[i]] = int(s)
-                    continue
-                except Exception:
-                    pass
-            if re.fullmatch(r"-?\d+\.\d+", s):
-                try:
-                    rec[headers[i]] = float(s)
-                    continue
-                except Exception:
-                    pass
-
-            # conservar string
-            rec[headers[i]] = s
-
-        # ignorar filas vacías
-        if all(v is None for v in rec.values()):
-            continue
-
-        records.append(rec)
-
-    return records
+    # descartar filas completamente vacías antes de cualquier coerción:
+    # las colas de hojas de Google suelen traer muchas filas en blanco
+    data_rows = [r for r in data_rows if any(c and str(c).strip() for c in r)]
+    if not data_rows:
+        return []
 
+    # asegurar longitud uniforme de filas antes de construir el DataFrame
+    rows = [
+        list(r[:num_cols]) + [""] * (num_cols - len(r)) if len(r) != num_cols else r
+        for r in data_rows
+    ]
+
+    # delegar la coerción numérica al parser C de pandas: las filas se
+    # vuelcan a un TSV en memoria y read_csv infiere int/float por columna
+    # a velocidad C (solo "" se trata como nulo, no "NA"/"null")
+    buf = io.StringIO()
+    csv.writer(buf, delimiter="\t", lineterminator="\n").writerows(rows)
+    buf.seek(0)
+    df = pd.read_csv(
+        buf,
+        sep="\t",
+        header=None,
+        names=headers,
+        keep_default_na=False,
+        na_values=[""],
+    )
 
+    cols_raw = None
+    for j, col in enumerate(df.columns):
+        s = df[col]
+        # dtype object no garantiza strings: TRUE/FALSE con algún vacío
+        # produce bools de Python mezclados con NaN, y .str reventaría
+        es_texto = pd.api.types.is_string_dtype(s) or (
+            s.dtype == object and s.dropna().map(type).eq(str).all()
+        )
+        if es_texto:
+            # columnas mixtas: strip, vacío->None y coerción numérica por
+            # celda solo donde el patrón calza
+            df[col] = _coerce_cell_strings(s.str.strip())
+        else:
+            # columnas que read_csv infirió como bool/int/float: el parser C
+            # acepta formas que el contrato conserva como string ("TRUE",
+            # "1e5"), así que la coerción se rehace desde las celdas
+            # originales con los mismos patrones que las columnas mixtas
+            if cols_raw is None:
+                cols_raw = list(zip(*rows))
+            orig = pd.Series(
+                [str(c).strip() for c in cols_raw[j]],
+                index=df.index,
+                dtype=object,
+            )
+            df[col] = _coerce_cell_strings(orig)
+
+    return df.to_dict(orient="records")
+
+
+@functools.lru_cache(maxsize=1024)
 def _normalize_col_name(name):
     s = str(name or "")
-    s = unicodedata.normalize('NFKD', s)
-    s = s.encode('ascii', 'ignore').decode('ascii')
+    s = s.translate(_ACCENT_TABLE)
+    if not s.isascii():
+        # caracteres fuera de la tabla: caer al plegado Unicode completo
+        s = unicodedata.normalize('NFKD', s)
+        s = s.encode('ascii', 'ignore').decode('ascii')
     s = s.lower().strip()
-    s = re.sub(r"[^a-z0-9]+", "_", s)
-    s = re.sub(r"_+", "_", s).strip("_")
+    s = _NON_ALNUM_RE.sub("_", s)
+    s = _UNDERSCORES_RE.sub("_", s).strip("_")
     return s
 
 
@@ -119,13 +205,20 @@ def _find_column(df, candidates):
     Retorna el nombre original de la columna si se encuentra, o None.
     """
     norm_map = { _normalize_col_name(c): c for c in df.columns }
-    for cand in candidates:
-        n = _normalize_col_name(cand)
+    return _find_column_normed(norm_map, candidates)
+
+
+def _find_column_normed(norm_map, candidates):
+    """Variante de _find_column que recibe el norm_map ya construido, para
+    no recalcularlo en búsquedas repetidas sobre el mismo DataFrame."""
+    # normalizar candidatos una sola vez, no por cada par (candidato, columna)
+    normed = [_normalize_col_name(cand) for cand in candidates]
+    for n in normed:
         if n in norm_map:
             return norm_map[n]
-    # intentar coincidencia por substring (caso 'fecha' en 'fecha_de_pago')
-    for cand in candidates:
-        n = _normalize_col_name(cand)
+    # intentar coincidencia por substring (caso 'fecha' en 'fecha_de_pago');
+    # el candidato va en el bucle externo para respetar su orden de prioridad
+    for n in normed:
         for k, orig in norm_map.items():
             if n in k or k in n:
                 return orig
@@ -144,8 +237,10 @@ def normalize_columns(df):
         "Estado": ["Estado", "estado", "ESTADO"],
     }
 
+    # el norm_map se construye una sola vez para las 4 búsquedas canónicas
+    norm_map = { _normalize_col_name(c): c for c in df.columns }
     for canonical, candidates in mapping.items():
-        found = _find_column(df, candidates)
+        found = _find_column_normed(norm_map, candidates)
         if found and found != canonical:
             try:
                 df.rename(columns={found: canonical}, inplace=True)
@@ -163,21 +258,18 @@ def extract_sheet_pi_1(sheet_id, worksheet_name, year, month):
     # =========================
     # CONEXIÓN GOOGLE SHEETS
     # =========================
-    ws = (
-        get_gspread_client()
-        .open_by_key(sheet_id)
-        .worksheet(worksheet_name)
-    )
+    ws = _open_book(sheet_id).worksheet(worksheet_name)
 
     # Asegurar que la segunda fila (fila index 1) se use siempre como cabecera
     values = ws.get_all_values()
     if len(values) >= 2:
         headers = [str(h).strip() for h in values[1]]
         data = values[2:]
-        df = pd.DataFrame(data, columns=headers)
+        df = _df_from_rows(headers, data)
     else:
         # fallback: usar la función auxiliar si no hay suficientes filas
-        df = get_records_with_header(ws, header_row=2)
+        # (reutiliza los values ya descargados, sin otra llamada a la API)
+        df = _df_from_values(values, header_row=2)
 
     logger.info(f"Registros totales extraídos: {len(df)}")
 
@@ -213,20 +305,16 @@ def extract_sheet_pi_2(sheet_id, worksheet_name, year, month):
     # =========================
     # CONEXIÓN GOOGLE SHEETS
     # =========================
-    ws = (
-        get_gspread_client()
-        .open_by_key(sheet_id)
-        .worksheet(worksheet_name)
-    )
+    ws = _open_book(sheet_id).worksheet(worksheet_name)
 
     # Usar la fila 3 (index 2) como cabecera cuando sea posible
     values = ws.get_all_values()
     if len(values) >= 3:
         headers = [str(h).strip() for h in values[2]]
         data = values[3:]
-        df = pd.DataFrame(data, columns=headers)
+        df = _df_from_rows(headers, data)
     else:
-        records = get_all_records_robust(ws)
+        records = _records_from_values(values)
         df = pd.DataFrame(records)
 
     logger.info(f"Registros totales extraídos: {len(df)}")
@@ -262,20 +350,16 @@ def extract_sheet_pi_3(sheet_id, worksheet_name, year, month):
     # =========================
     # CONEXIÓN GOOGLE SHEETS
     # =========================
-    ws = (
-        get_gspread_client()
-        .open_by_key(sheet_id)
-        .worksheet(worksheet_name)
-    )
+    ws = _open_book(sheet_id).worksheet(worksheet_name)
 
     # Usar la fila 6 (index 5) como cabecera cuando sea posible
     values = ws.get_all_values()
     if len(values) >= 6:
         headers = [str(h).strip() for h in values[5]]
         data = values[6:]
-        df = pd.DataFrame(data, columns=headers)
+        df = _df_from_rows(headers, data)
     else:
-        records = get_all_records_robust(ws)
+        records = _records_from_values(values)
         df = pd.DataFrame(records)
 
     logger.info(f"Registros totales extraídos: {len(df)}")
@@ -1,6 +1,20 @@
 from supabase import create_client
 from dotenv import load_dotenv
+import gzip
+import json
 import os
+import re
+import httpx
+
+try:
+    import orjson
+except ImportError:  # fallback al json estándar si orjson no está instalado
+    orjson = None
+
+try:
+    import psycopg  # opcional: solo para la vía COPY con conexión directa
+except ImportError:
+    psycopg = None
 import pandas as pd
 import math
 import numpy as np
@@ -8,6 +22,7 @@ from datetime import datetime
 from decimal import Decimal
 from logger import get_logger
 from postgrest.exceptions import APIError
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as futures_wait, FIRST_COMPLETED
 import time
 
 logger = get_logger("LOAD")
@@ -29,6 +44,146 @@ else:
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Sesión HTTP persistente hacia PostgREST: reutiliza la conexión TCP/TLS
+# entre lotes y permite comprimir los cuerpos con gzip
+_GZIP_MIN_BYTES = 4096
+# Lotes de carga en vuelo simultáneamente contra PostgREST
+_MAX_IN_FLIGHT = 8
+# Payload objetivo por request de carga (antes de comprimir)
+_TARGET_BATCH_BYTES = 1_500_000
+# A partir de cuántas filas conviene la vía COPY directa a Postgres
+_COPY_THRESHOLD = 5000
+# Directorio de backups/auditoría (creado una sola vez al importar)
+_OUT_DIR = os.path.join(os.getcwd(), "etl", "output")
+os.makedirs(_OUT_DIR, exist_ok=True)
+# Errores de red/gateway que pueden recuperarse con reintentos
+_TRANSIENT_RE = re.compile(
+    r"network connection lost|gateway error|timeout|50[234]|connection reset|temporarily unavailable",
+    re.IGNORECASE,
+)
+_http_session = None
+
+
+def _get_http_session():
+    global _http_session
+    if _http_session is None and SUPABASE_URL and SUPABASE_KEY:
+        _http_session = httpx.Client(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            headers={
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+                "Content-Type": "application/json",
+            },
+            timeout=60,
+        )
+    return _http_session
+
+
+def _post_rows(table_name, rows, upsert=False):
+    """Inserta (o upserta) filas vía PostgREST sobre la sesión persistente,
+    comprimiendo el cuerpo con gzip cuando supera _GZIP_MIN_BYTES. Si no hay
+    sesión disponible cae al cliente supabase estándar."""
+    session = _get_http_session()
+    if session is None:
+        if upsert:
+            supabase.table(table_name).upsert(rows).execute()
+        else:
+            supabase.table(table_name).insert(rows).execute()
+        return
+
+    # orjson serializa en C (3-5x más rápido que el json estándar)
+    if orjson is not None:
+        body = orjson.dumps(rows, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        body = json.dumps(rows).encode("utf-8")
+    # return=minimal suprime el eco de las filas insertadas en la respuesta;
+    # merge-duplicates hace que el POST masivo resuelva conflictos como upsert
+    if upsert:
+        headers = {"Prefer": "return=minimal,resolution=merge-duplicates"}
+    else:
+        headers = {"Prefer": "return=minimal"}
+    if len(body) >= _GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+
+    resp = session.post(f"/{table_name}", content=body, headers=headers)
+    resp.raise_for_status()
+
+
+def _backup_rows(df, mask, out_path, chunk_rows=10000):
+    """Escribe el backup CSV de auditoría por tramos (append) en lugar de
+    materializar la copia filtrada completa en memoria. Devuelve la cantidad
+    de filas escritas."""
+    idx = df.index[mask]
+    for start in range(0, len(idx), chunk_rows):
+        first = start == 0
+        df.loc[idx[start:start + chunk_rows]].to_csv(
+            out_path, mode="w" if first else "a", header=first, index=False
+        )
+    return len(idx)
+
+
+def fetch_column_values(table_name, column, page_size=1000):
+    """Baja todos los valores de una columna paginando de a page_size.
+
+    Pensado para traer un keyset completo (p.ej. matriculas.codigo_matricula)
+    una sola vez por corrida del pipeline, en lugar de validar FKs con loops
+    de consultas in.() por chunks. Devuelve un set, o None si la descarga
+    falla (el caller debe caer a la validación por chunks)."""
+    vals = set()
+    try:
+        session = _get_http_session()
+        offset = 0
+        while True:
+            if session is not None:
+                resp = session.get(
+                    f"/{table_name}",
+                    params={"select": column},
+                    headers={"Range-Unit": "items", "Range": f"{offset}-{offset + page_size - 1}"},
+                )
+                resp.raise_for_status()
+                part = resp.json()
+            else:
+                resp = supabase.table(table_name).select(column).range(offset, offset + page_size - 1).execute()
+                part = resp.data or []
+            for r in part:
+                vals.add(r.get(column) if isinstance(r, dict) else r)
+            if len(part) < page_size:
+                break
+            offset += page_size
+        vals.discard(None)
+        return vals
+    except Exception as e:
+        logger.warning(f"No se pudo bajar el keyset completo de '{table_name}.{column}': {e}")
+        return None
+
+
+def _copy_load(table_name, cols, arrays, total_records):
+    """Carga masiva vía COPY con conexión directa a Postgres.
+
+    Solo se intenta si psycopg está instalado, SUPABASE_DB_URL está
+    configurada (pooler de Supavisor en modo sesión) y el volumen justifica
+    saltarse PostgREST. Devuelve True si la carga se completó por esta vía;
+    False para que el caller siga con la vía REST."""
+    db_url = os.getenv("SUPABASE_DB_URL")
+    if psycopg is None or not db_url or total_records < _COPY_THRESHOLD:
+        return False
+    try:
+        with psycopg.connect(db_url) as conn:
+            with conn.cursor() as cur:
+                # commit asíncrono por sesión: carga bulk, no transaccional crítica
+                cur.execute("SET synchronous_commit = OFF")
+                col_list = ", ".join('"{}"'.format(c) for c in cols)
+                with cur.copy(f'COPY "{table_name}" ({col_list}) FROM STDIN') as cp:
+                    for idx in range(total_records):
+                        cp.write_row(tuple(a[idx] for a in arrays))
+            conn.commit()
+        logger.info(f"Carga vía COPY directa a Postgres: {total_records} registros en '{table_name}'")
+        return True
+    except Exception as e:
+        logger.warning(f"Falló la carga vía COPY directa (continuando por REST): {e}")
+        return False
+
 # Columnas requeridas por tabla (si están ausentes/null, se eliminará el registro antes de insertar)
 REQUIRED_COLUMNS_BY_TABLE = {
     "pagos": ["fecha_pago"],
@@ -36,44 +191,192 @@ REQUIRED_COLUMNS_BY_TABLE = {
     # "matriculas": ["codigo_matricula"],
 }
 
-def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_column: str = None, dedupe_df: bool = True, drop_missing_students: bool = False, drop_missing_matriculas: bool = False, required_columns: list = None, upsert: bool = False):
+
+def _fetch_existing(table_name, column, keys, chunk_size=500, max_workers=8):
+    """Retorna el set de claves de `keys` que SÍ existen en `table_name.column`.
+
+    Los lotes de select().in_() son independientes, así que se lanzan en
+    paralelo con un ThreadPoolExecutor para solapar las latencias de red.
+    """
+    def _fetch_chunk(chunk):
+        session = _get_http_session()
+        if session is not None:
+            # GET directo a PostgREST sobre la sesión keep-alive compartida
+            quoted = ",".join('"{}"'.format(str(k).replace('"', '\\"')) for k in chunk)
+            resp = session.get(
+                f"/{table_name}",
+                params={"select": column, column: f"in.({quoted})"},
+            )
+            resp.raise_for_status()
+            part = resp.json()
+        else:
+            resp = supabase.table(table_name).select(column).in_(column, chunk).execute()
+            try:
+                part = resp.data if hasattr(resp, "data") else (resp.get("data") if isinstance(resp, dict) else None)
+            except Exception:
+                part = None
+
+        if not part:
+            return set()
+        return {r.get(column) if isinstance(r, dict) else r[column] for r in part}
+
+    chunks = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+    existing = set()
+
+    if len(chunks) <= 1:
+        for chunk in chunks:
+            existing.update(_fetch_chunk(chunk))
+        return existing
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_fetch_chunk, chunk) for chunk in chunks]
+        for fut in as_completed(futures):
+            existing.update(fut.result())
+
+    return existing
+
+
+def _find_missing_keys(table_name, column, keys, chunk_size=500):
+    """Retorna las claves de `keys` que NO existen en `table_name.column`.
+
+    Intenta primero el RPC `find_missing_keys` (el filtrado ocurre en el
+    servidor y solo viajan las claves faltantes); si el RPC no está definido
+    en la base, cae al chequeo por lotes con select().in_().
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+
+    try:
+        resp = supabase.rpc(
+            "find_missing_keys",
+            {"p_table": table_name, "p_column": column, "p_keys": keys},
+        ).execute()
+        part = resp.data if hasattr(resp, "data") else None
+        if part is not None:
+            return list(part)
+    except Exception as e:
+        logger.debug(f"RPC find_missing_keys no disponible; usando chequeo por lotes: {e}")
+
+    existing = _fetch_existing(table_name, column, keys, chunk_size=chunk_size)
+    if not existing:
+        return keys
+    # diferencia en C (ordena y mergea) en vez de comprensión/sets en Python
+    return np.setdiff1d(
+        np.asarray(keys, dtype=object),
+        np.asarray(list(existing), dtype=object),
+        assume_unique=True,
+    ).tolist()
+
+def _sanitize_value(v):
+    # None / NaN
+    try:
+        if pd.isna(v):
+            return None
+    except Exception:
+        pass
+
+    # unwrap numpy / pandas scalars
+    if hasattr(v, "item"):
+        try:
+            v = v.item()
+        except Exception:
+            pass
+
+    # numpy arrays -> lists
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+
+    # floats: filter inf/-inf
+    if isinstance(v, (float, np.floating)):
+        try:
+            fv = float(v)
+            if not math.isfinite(fv):
+                return None
+            return fv
+        except Exception:
+            return None
+
+    # ints
+    if isinstance(v, (int, np.integer)):
+        return int(v)
+
+    # bools
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+
+    # datetimes / timestamps
+    if isinstance(v, (datetime, pd.Timestamp)):
+        try:
+            return v.isoformat()
+        except Exception:
+            return str(v)
+
+    # Decimal
+    if isinstance(v, Decimal):
+        try:
+            return float(v)
+        except Exception:
+            return None
+
+    return v
+
+def _sanitize_dataframe(frame):
+    """Sanear el DataFrame por columnas (vectorizado): datetimes a ISO,
+    floats no finitos a nulo y NaN/NaT uniformemente a None. Evita llamar
+    a _sanitize_value celda por celda en las columnas tipadas."""
+    frame = frame.copy()
+    for col in frame.columns:
+        s = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            frame[col] = s.dt.strftime("%Y-%m-%dT%H:%M:%S")
+        elif pd.api.types.is_float_dtype(s):
+            frame[col] = s.where(np.isfinite(s), other=np.nan)
+        elif s.dtype == object:
+            # columnas object pueden traer Decimal/escalares numpy sueltos
+            frame[col] = s.map(_sanitize_value)
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_column: str = None, dedupe_df: bool = True, drop_missing_students: bool = False, drop_missing_matriculas: bool = False, required_columns: list = None, upsert: bool = False, known_keys: dict = None):
     
     logger.info(f"Cargando {len(df)} registros en Supabase tabla: {table_name}")
     logger.info(f"Columnas recibidas para carga: {df.columns.tolist()}")
 
+    # Un solo timestamp por invocación para los archivos de auditoría
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
     # Verificaciones previas: duplicados en DataFrame y (opcional) en la DB
     if pk_column:
         if pk_column not in df.columns:
             logger.warning(f"pk_column especificado ('{pk_column}') no está en el DataFrame. Se omitirá la verificación de duplicados.")
         else:
-            # Duplicados dentro del DataFrame
-            dup_mask = df.duplicated(subset=[pk_column], keep=False)
-            if dup_mask.any():
-                dup_vals = df.loc[dup_mask, pk_column].unique().tolist()
+            # Duplicados dentro del DataFrame: una sola pasada de factorize
+            # alimenta la detección, el listado de valores y el dedupe
+            codes, uniques = pd.factorize(df[pk_column], use_na_sentinel=False)
+            counts = np.bincount(codes) if len(codes) else np.array([], dtype=np.int64)
+            dup_codes = counts > 1
+            if dup_codes.any():
+                dup_vals = np.asarray(uniques)[dup_codes].tolist()
                 if dedupe_df:
                     logger.warning(f"Duplicados detectados en DataFrame para PK '{pk_column}': {dup_vals}. Se eliminarán duplicados quedando con la última fila por PK (dedupe_df=True).")
-                    df = df.drop_duplicates(subset=[pk_column], keep="last").reset_index(drop=True)
+                    # conservar la última fila por PK reutilizando los codes
+                    last_idx = np.empty(len(uniques), dtype=np.int64)
+                    last_idx[codes] = np.arange(len(codes))
+                    keep = np.zeros(len(codes), dtype=bool)
+                    keep[last_idx] = True
+                    df = df[keep].reset_index(drop=True)
                 else:
                     logger.error(f"Duplicados detectados en DataFrame para PK '{pk_column}': {dup_vals}")
                     raise ValueError(f"Duplicados en DataFrame para PK '{pk_column}': {dup_vals}")
             # Obtener lista de claves a operar
             keys = [k for k in df[pk_column].dropna().unique().tolist()]
 
-            # Intentar verificar claves existentes en la tabla (no destructivo), en lotes
+            # Intentar verificar claves existentes en la tabla (no destructivo)
             try:
                 if keys:
-                    CHUNK_SIZE = 500
-                    existing_vals = []
-                    for i in range(0, len(keys), CHUNK_SIZE):
-                        chunk = keys[i:i+CHUNK_SIZE]
-                        resp = supabase.table(table_name).select(pk_column).in_(pk_column, chunk).execute()
-                        try:
-                            part = resp.data if hasattr(resp, "data") else (resp.get("data") if isinstance(resp, dict) else None)
-                        except Exception:
-                            part = None
-
-                        if part:
-                            existing_vals.extend([r.get(pk_column) if isinstance(r, dict) else r[pk_column] for r in part])
+                    missing = _find_missing_keys(table_name, pk_column, keys)
+                    existing_vals = np.setdiff1d(np.asarray(keys, dtype=object), np.asarray(missing, dtype=object)).tolist()
 
                     if existing_vals:
                         # Logging optimizado: mostrar solo cantidad + ejemplos
@@ -88,22 +391,12 @@ def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_colu
             try:
                 if table_name == "matriculas" and "codigo_estudiante" in df.columns:
                     student_keys = [k for k in df["codigo_estudiante"].dropna().unique().tolist()]
-                    missing_students = []
-                    if student_keys:
-                        CHUNK_SIZE = 500
-                        existing_students = []
-                        for i in range(0, len(student_keys), CHUNK_SIZE):
-                            chunk = student_keys[i:i+CHUNK_SIZE]
-                            resp = supabase.table("estudiantes").select("codigo_estudiante").in_("codigo_estudiante", chunk).execute()
-                            try:
-                                part = resp.data if hasattr(resp, "data") else (resp.get("data") if isinstance(resp, dict) else None)
-                            except Exception:
-                                part = None
-
-                            if part:
-                                existing_students.extend([r.get("codigo_estudiante") if isinstance(r, dict) else r["codigo_estudiante"] for r in part])
-
-                        missing_students = list(set(student_keys) - set(existing_students))
+                    if known_keys and "codigo_estudiante" in known_keys:
+                        # El pipeline ya tiene el maestro de estudiantes en
+                        # memoria: membership en set en vez de consultas HTTP
+                        missing_students = [k for k in student_keys if k not in known_keys["codigo_estudiante"]]
+                    else:
+                        missing_students = _find_missing_keys("estudiantes", "codigo_estudiante", student_keys)
 
                     if missing_students:
                         total_missing = len(missing_students)
@@ -112,18 +405,13 @@ def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_colu
                         if drop_missing_students:
                             try:
                                 # Guardar los registros que serán eliminados en un CSV para auditoría
-                                out_dir = os.path.join(os.getcwd(), "etl", "output")
-                                os.makedirs(out_dir, exist_ok=True)
-                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                out_path = os.path.join(out_dir, f"matriculas_missing_students_{timestamp}.csv")
+                                out_path = os.path.join(_OUT_DIR, f"matriculas_missing_students_{timestamp}.csv")
                                 mask_missing = df["codigo_estudiante"].isin(missing_students)
-                                df_missing = df.loc[mask_missing]
-                                df_missing.to_csv(out_path, index=False)
+                                _backup_rows(df, mask_missing, out_path)
                                 logger.info(f"Registros de 'matriculas' con estudiantes faltantes guardados en: {out_path}. Serán eliminados antes de la carga.")
                                 # Eliminar filas faltantes del DataFrame para continuar
                                 df = df.loc[~mask_missing].reset_index(drop=True)
-                                # Recompute data and keys after removal
-                                data = df.to_dict(orient="records")
+                                # Recompute keys after removal
                                 keys = [k for k in df[pk_column].dropna().unique().tolist()] if pk_column and pk_column in df.columns else []
                             except Exception as e:
                                 logger.error(f"Error al guardar/eliminar registros faltantes: {e}")
@@ -136,58 +424,38 @@ def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_colu
     # Si se definen columnas requeridas, eliminar filas con nulos en esas columnas
     cols_required = required_columns if required_columns is not None else REQUIRED_COLUMNS_BY_TABLE.get(table_name, [])
     if cols_required:
-        missing_mask = pd.DataFrame(df)[cols_required].isna().any(axis=1)
+        missing_mask = df[cols_required].isna().to_numpy().any(axis=1)
         if missing_mask.any():
-            removed_df = df.loc[missing_mask]
+            valid_mask = ~missing_mask
             # Guardar backup de registros eliminados
-            out_dir = os.path.join(os.getcwd(), "etl", "output")
-            os.makedirs(out_dir, exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            out_path = os.path.join(out_dir, f"{table_name}_removed_nulls_{timestamp}.csv")
+            out_path = os.path.join(_OUT_DIR, f"{table_name}_removed_nulls_{timestamp}.csv")
             try:
-                removed_df.to_csv(out_path, index=False)
-                logger.info(f"Se eliminaron {len(removed_df)} registros de '{table_name}' por nulos en columnas requeridas {cols_required}. Backup: {out_path}")
+                removidos = _backup_rows(df, missing_mask, out_path)
+                logger.info(f"Se eliminaron {removidos} registros de '{table_name}' por nulos en columnas requeridas {cols_required}. Backup: {out_path}")
             except Exception as e:
                 logger.warning(f"No se pudo guardar backup de registros eliminados por nulos: {e}")
 
             # Filtrar df para continuar con los registros válidos
-            df = df.loc[~missing_mask].reset_index(drop=True)
+            df = df.loc[valid_mask].reset_index(drop=True)
 
     # Validación de claves foráneas para pagos (ejecutar siempre, incluso si no se pasó pk_column)
     try:
         if table_name == "pagos" and "codigo_matricula" in df.columns:
             payment_keys = [k for k in df["codigo_matricula"].dropna().unique().tolist()]
             logger.info(f"Validando FK 'matriculas' para pagos: {len(payment_keys)} claves a verificar")
-            missing_payments = []
-            if payment_keys:
-                CHUNK_SIZE = 500
-                existing_mats = []
-                for i in range(0, len(payment_keys), CHUNK_SIZE):
-                    chunk = payment_keys[i:i+CHUNK_SIZE]
-                    resp = supabase.table("matriculas").select("codigo_matricula").in_("codigo_matricula", chunk).execute()
-                    try:
-                        part = resp.data if hasattr(resp, "data") else (resp.get("data") if isinstance(resp, dict) else None)
-                    except Exception:
-                        part = None
-
-                    if part:
-                        existing_mats.extend([r.get("codigo_matricula") if isinstance(r, dict) else r["codigo_matricula"] for r in part])
-
-                logger.info(f"Encontradas en DB (muestras hasta 5): {existing_mats[:5]} (total {len(existing_mats)})")
-                missing_payments = list(set(payment_keys) - set(existing_mats))
+            if known_keys and "codigo_matricula" in known_keys:
+                missing_payments = [k for k in payment_keys if k not in known_keys["codigo_matricula"]]
+            else:
+                missing_payments = _find_missing_keys("matriculas", "codigo_matricula", payment_keys)
 
             if missing_payments:
                 logger.error(f"Faltan matriculas referenciadas en 'pagos' no presentes en 'matriculas' (total {len(missing_payments)}). Ejemplos: {missing_payments[:5]}")
                 if drop_missing_matriculas:
                     try:
-                        out_dir = os.path.join(os.getcwd(), "etl", "output")
-                        os.makedirs(out_dir, exist_ok=True)
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        out_path = os.path.join(out_dir, f"pagos_missing_matriculas_{timestamp}.csv")
+                        out_path = os.path.join(_OUT_DIR, f"pagos_missing_matriculas_{timestamp}.csv")
                         mask_missing = df["codigo_matricula"].isin(missing_payments)
-                        df_missing = df.loc[mask_missing]
-                        df_missing.to_csv(out_path, index=False)
-                        logger.info(f"Registros de 'pagos' con matriculas faltantes guardados en: {out_path}. Serán eliminados antes de la carga. Cantidad: {len(df_missing)}")
+                        respaldados = _backup_rows(df, mask_missing, out_path)
+                        logger.info(f"Registros de 'pagos' con matriculas faltantes guardados en: {out_path}. Serán eliminados antes de la carga. Cantidad: {respaldados}")
                         df = df.loc[~mask_missing].reset_index(drop=True)
                     except Exception as e:
                         logger.error(f"Error al guardar/eliminar registros faltantes en 'pagos': {e}")
@@ -197,96 +465,38 @@ def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_colu
     except Exception as e:
         logger.warning(f"Error verificando claves foraneas de 'pagos' (continuando): {e}")
 
-    data = df.to_dict(orient="records")
+    # Sanear datos antes de la inserción (una pasada por columna, no por celda).
+    # Los registros se materializan lote a lote durante la carga, así el pico
+    # de memoria es O(lote) y no O(filas).
+    df = _sanitize_dataframe(df)
 
-    def _sanitize_value(v):
-        # None / NaN
-        try:
-            if pd.isna(v):
-                return None
-        except Exception:
-            pass
-
-        # unwrap numpy / pandas scalars
-        if hasattr(v, "item"):
-            try:
-                v = v.item()
-            except Exception:
-                pass
-
-        # numpy arrays -> lists
-        if isinstance(v, np.ndarray):
-            return v.tolist()
-
-        # floats: filter inf/-inf
-        if isinstance(v, (float, np.floating)):
-            try:
-                fv = float(v)
-                if not math.isfinite(fv):
-                    return None
-                return fv
-            except Exception:
-                return None
-
-        # ints
-        if isinstance(v, (int, np.integer)):
-            return int(v)
-
-        # bools
-        if isinstance(v, (bool, np.bool_)):
-            return bool(v)
-
-        # datetimes / timestamps
-        if isinstance(v, (datetime, pd.Timestamp)):
-            try:
-                return v.isoformat()
-            except Exception:
-                return str(v)
-
-        # Decimal
-        if isinstance(v, Decimal):
-            try:
-                return float(v)
-            except Exception:
-                return None
-
-        return v
-
-
-    # Sanear datos antes de la inserción
-    cleaned_data = [{k: _sanitize_value(v) for k, v in rec.items()} for rec in data]
-
-    # Constantes para batching y reintentos
-    BATCH_SIZE = 100  # Reducido de 3512 a 100 para evitar timeouts
+    # Constantes para reintentos
     MAX_RETRIES = 3
     RETRY_DELAY_BASE = 2  # segundos
 
     def _is_transient_error(error):
         """Determina si el error es transitorio (red) o permanente (validación)"""
-        error_str = str(error).lower()
-        # Errores de red/gateway que pueden recuperarse con reintentos
-        transient_patterns = [
-            'network connection lost',
-            'gateway error',
-            'timeout',
-            '502', '503', '504',
-            'connection reset',
-            'temporarily unavailable'
-        ]
-        return any(pattern in error_str for pattern in transient_patterns)
+        return bool(_TRANSIENT_RE.search(str(error)))
 
     def _execute_with_retry(operation, batch_data, batch_num, total_batches):
         """Ejecuta operación con reintentos exponenciales para errores transitorios"""
         for attempt in range(MAX_RETRIES):
             try:
-                if operation == 'upsert':
-                    supabase.table(table_name).upsert(batch_data).execute()
-                else:
-                    supabase.table(table_name).insert(batch_data).execute()
+                _post_rows(table_name, batch_data, upsert=(operation == 'upsert'))
                 return True
             except Exception as e:
                 is_last_attempt = (attempt == MAX_RETRIES - 1)
-                
+
+                # Payload demasiado grande: partir el lote a la mitad y
+                # reenviar cada mitad, en vez de reintentar el mismo tamaño.
+                err_txt = str(e).lower()
+                if len(batch_data) > 1 and ('413' in err_txt or 'too large' in err_txt):
+                    mid = len(batch_data) // 2
+                    logger.warning(f"Batch {batch_num}/{total_batches}: payload demasiado grande ({len(batch_data)} registros). Partiendo en dos mitades: {e}")
+                    ok_a = _execute_with_retry(operation, batch_data[:mid], batch_num, total_batches)
+                    ok_b = _execute_with_retry(operation, batch_data[mid:], batch_num, total_batches)
+                    return ok_a and ok_b
+
                 if _is_transient_error(e):
                     if is_last_attempt:
                         logger.error(f"Batch {batch_num}/{total_batches}: Error transitorio persistente tras {MAX_RETRIES} intentos: {e}")
@@ -301,29 +511,76 @@ def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_colu
                     raise
         return False
 
-    # Procesar en lotes (batching)
-    total_records = len(cleaned_data)
+    # Procesar en lotes (batching). Los registros se arman desde los arrays
+    # de columna (ya saneados a objetos nativos) con zip, sin pasar por
+    # to_dict(orient='records') ni iloc por lote.
+    total_records = len(df)
+
+    cols = list(df.columns)
+    arrays = [df[c].to_numpy() for c in cols]
+
+    # Tamaño de lote adaptativo por bytes: una fila de 'cursos' no pesa lo
+    # mismo que una de 'pagos'; se apunta a ~1.5 MB de payload por request
+    # en lugar de un conteo fijo de filas.
+    batch_size = 100
+    if total_records:
+        sample = dict(zip(cols, (a[0] for a in arrays)))
+        if orjson is not None:
+            row_bytes = len(orjson.dumps(sample, option=orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            row_bytes = len(json.dumps(sample).encode("utf-8"))
+        batch_size = max(50, min(5000, _TARGET_BATCH_BYTES // max(1, row_bytes)))
+
+    BATCH_SIZE = batch_size
     total_batches = math.ceil(total_records / BATCH_SIZE)
-    
+
     logger.info(f"Procesando {total_records} registros en {total_batches} lotes de {BATCH_SIZE}")
-    
-    try:
+
+    operation = 'upsert' if upsert else 'insert'
+
+    # Volúmenes grandes de insert: intentar COPY directo a Postgres y
+    # saltarse PostgREST por completo (los upserts siguen por REST)
+    if not upsert and _copy_load(table_name, cols, arrays, total_records):
+        logger.info(f"Carga completada: {total_records} registros vía COPY")
+        return
+
+    def _iter_batches():
         for i in range(0, total_records, BATCH_SIZE):
-            batch = cleaned_data[i:i + BATCH_SIZE]
-            batch_num = (i // BATCH_SIZE) + 1
-            
-            logger.info(f"Procesando lote {batch_num}/{total_batches} ({len(batch)} registros)")
-            
-            operation = 'upsert' if upsert else 'insert'
-            _execute_with_retry(operation, batch, batch_num, total_batches)
-            
-            # Pequeña pausa entre lotes para no sobrecargar el servidor
-            if batch_num < total_batches:
-                time.sleep(0.5)
-        
+            batch = [
+                dict(zip(cols, vals))
+                for vals in zip(*(a[i:i + BATCH_SIZE] for a in arrays))
+            ]
+            yield (i // BATCH_SIZE) + 1, batch
+
+    try:
+        if total_batches <= 1:
+            for batch_num, batch in _iter_batches():
+                logger.info(f"Procesando lote {batch_num}/{total_batches} ({len(batch)} registros)")
+                _execute_with_retry(operation, batch, batch_num, total_batches)
+        else:
+            # Solapar los envíos: hasta _MAX_IN_FLIGHT lotes en vuelo a la
+            # vez. El throttling queda a cargo del backoff de reintentos en
+            # lugar de la pausa fija de 0.5s entre lotes.
+            in_flight = {}
+            with ThreadPoolExecutor(max_workers=_MAX_IN_FLIGHT) as executor:
+                for batch_num, batch in _iter_batches():
+                    logger.info(f"Procesando lote {batch_num}/{total_batches} ({len(batch)} registros)")
+                    fut = executor.submit(_execute_with_retry, operation, batch, batch_num, total_batches)
+                    in_flight[fut] = batch_num
+
+                    # acotar los lotes materializados en memoria
+                    if len(in_flight) >= _MAX_IN_FLIGHT * 2:
+                        done, _pending = futures_wait(in_flight, return_when=FIRST_COMPLETED)
+                        for d in done:
+                            in_flight.pop(d)
+                            d.result()
+
+                for fut in as_completed(list(in_flight)):
+                    fut.result()
+
         logger.info(f"Carga completada: {total_records} registros en {total_batches} lotes")
         return
-        
+
     except Exception:
         logger.exception("Error en carga por lotes a Supabase.")
 
@@ -334,8 +591,8 @@ def load(table_name: str, df: pd.DataFrame, abort_on_error: bool = True, pk_colu
         logger.warning("Inserción por lotes falló; intentando inserción registro a registro para aislar el conflicto (abort_on_error=False).")
 
     # Si llegamos acá, se solicitó intentar por registro (modo debug).
-    for idx, rec in enumerate(data):
-        rec_clean = {k: _sanitize_value(v) for k, v in rec.items()}
+    for idx in range(total_records):
+        rec_clean = dict(zip(cols, (a[idx] for a in arrays)))
 
         try:
             supabase.table(table_name).insert(rec_clean).execute()
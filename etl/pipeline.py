@@ -1,4 +1,8 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from datetime import date, timedelta
 from dotenv import load_dotenv
@@ -17,13 +21,55 @@ from transform import (
     transform_regular_pagos,
     transform_estudiantes,
 )
-from load import load
+from load import load, fetch_column_values
 
 logger = get_logger("PIPELINE")
 
 load_dotenv()
 
 
+def _hashes_path(table_name):
+    return os.path.join(os.getcwd(), "etl", "output", f"{table_name}_hashes.json")
+
+
+def _filter_changed_rows(table_name, df, pk_column):
+    """Filtra las filas cuyo contenido cambió desde la última corrida.
+
+    Compara un SHA-256 por fila contra el manifiesto persistido en
+    etl/output/{tabla}_hashes.json y devuelve (df_cambiadas, hashes_nuevos).
+    Si no hay manifiesto previo (o no se puede leer) se consideran todas
+    cambiadas, que es el comportamiento anterior."""
+    prev = {}
+    try:
+        with open(_hashes_path(table_name), "r", encoding="utf-8") as fh:
+            prev = json.load(fh)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"No se pudo leer el manifiesto de hashes de '{table_name}' (se upserteará todo): {e}")
+
+    hashes = {}
+    changed_idx = []
+    for idx, rec in zip(df.index, df.to_dict(orient="records")):
+        key = str(rec.get(pk_column))
+        h = hashlib.sha256(json.dumps(rec, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+        hashes[key] = h
+        if prev.get(key) != h:
+            changed_idx.append(idx)
+    return df.loc[changed_idx], hashes
+
+
+def _save_hashes(table_name, hashes):
+    """Persiste el manifiesto de hashes tras una carga exitosa (best-effort)."""
+    try:
+        out_dir = os.path.join(os.getcwd(), "etl", "output")
+        os.makedirs(out_dir, exist_ok=True)
+        with open(_hashes_path(table_name), "w", encoding="utf-8") as fh:
+            json.dump(hashes, fh)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el manifiesto de hashes de '{table_name}': {e}")
+
+
 def run_pipeline(year=None, month=None):
     """ETL diario que extrae datos del día anterior para matrículas y pagos.
     
@@ -44,6 +90,29 @@ def run_pipeline(year=None, month=None):
     df_primera_cuota_pi_final = pd.DataFrame()
     df_regular_pagos_final = pd.DataFrame()
     df_es_final = pd.DataFrame()
+    codigos_matriculas_validas = pd.Index([])
+
+    # ==================== PASO 0: EXTRACCIONES EN PARALELO ====================
+    # Las cuatro descargas de Sheets no dependen entre sí: emitirlas en
+    # paralelo esconde la latencia de red. Las transformaciones y cargas
+    # siguen secuenciales (CPU-bound y con dependencias de FK).
+    logger.info("Extrayendo las 4 hojas en paralelo...")
+    # Config de entorno resuelta una sola vez al inicio (y consistente
+    # durante toda la corrida aunque el entorno cambie)
+    sheet_id = os.getenv("Matricula_PI_ID")
+    ws_cursos = os.getenv("WORKSHEET_CURSOS")
+    ws_estudiantes = os.getenv("WORKSHEET_ESTUDIANTES")
+    ws_matriculas = os.getenv("WORKSHEET_MATRICULAS")
+    ws_pagos = os.getenv("WORKSHEET_PAGOS")
+    extract_jobs = {
+        "cursos": (extract_sheet_pi_1, (sheet_id, ws_cursos, None, None)),
+        "estudiantes": (extract_sheet_pi_1, (sheet_id, ws_estudiantes, None, None)),
+        "matriculas": (extract_sheet_pi_2, (sheet_id, ws_matriculas, None, None)),
+        "pagos": (extract_sheet_pi_3, (sheet_id, ws_pagos, None, None)),
+    }
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = {name: ex.submit(fn, *args) for name, (fn, args) in extract_jobs.items()}
+        raws = {name: fut.result() for name, fut in futures.items()}
 
     # ==================== PASO 1: UPSERTS DE DATOS MAESTROS ====================
     logger.info("="*60)
@@ -52,53 +121,55 @@ def run_pipeline(year=None, month=None):
     
     # ==================== CURSOS (UPSERT) ====================
     logger.info("Procesando hoja Cursos (datos maestros - UPSERT)")
-    df_cursos_pi_raw = extract_sheet_pi_1(
-        os.getenv("Matricula_PI_ID"),
-        os.getenv("WORKSHEET_CURSOS"),
-        None,
-        None,
-    )
+    df_cursos_pi_raw = raws["cursos"]
     if not df_cursos_pi_raw.empty:
         df_cursos_pi_final = transform_cursos(df_cursos_pi_raw)
         logger.info(f"Cursos extraídos y transformados: {len(df_cursos_pi_final)}")
     else:
         logger.warning("No se extrajeron cursos")
     
-    # Cargar cursos con upsert
+    # Cargar cursos con upsert (solo filas cuyo contenido cambió)
     if not df_cursos_pi_final.empty:
-        logger.info(f"Cargando {len(df_cursos_pi_final)} cursos con UPSERT...")
-        try:
-            load("cursos", df_cursos_pi_final, upsert=True, pk_column="codigo_curso")
-            logger.info(f"✓ Cursos cargados exitosamente: {len(df_cursos_pi_final)} registros")
-        except Exception as e:
-            logger.error(f"✗ Error al cargar cursos: {e}")
-            raise
+        df_cursos_cambiados, hashes_cursos = _filter_changed_rows("cursos", df_cursos_pi_final, "codigo_curso")
+        if df_cursos_cambiados.empty:
+            logger.info(f"Cursos sin cambios desde la última corrida ({len(df_cursos_pi_final)} filas), se omite el upsert")
+            _save_hashes("cursos", hashes_cursos)
+        else:
+            logger.info(f"Cargando {len(df_cursos_cambiados)} de {len(df_cursos_pi_final)} cursos con UPSERT...")
+            try:
+                load("cursos", df_cursos_cambiados, upsert=True, pk_column="codigo_curso")
+                logger.info(f"✓ Cursos cargados exitosamente: {len(df_cursos_cambiados)} registros")
+                _save_hashes("cursos", hashes_cursos)
+            except Exception as e:
+                logger.error(f"✗ Error al cargar cursos: {e}")
+                raise
     else:
         logger.info("No hay cursos para cargar")
 
     # ==================== ESTUDIANTES (UPSERT) ====================
     logger.info("Procesando hoja Estudiantes (datos maestros - UPSERT)")
-    df_alumnos_pi_raw = extract_sheet_pi_1(
-        os.getenv("Matricula_PI_ID"),
-        os.getenv("WORKSHEET_ESTUDIANTES"),
-        None,
-        None,
-    )
+    df_alumnos_pi_raw = raws["estudiantes"]
     if not df_alumnos_pi_raw.empty:
         df_es_final = transform_estudiantes(df_alumnos_pi_raw)
         logger.info(f"Estudiantes extraídos y transformados: {len(df_es_final)}")
     else:
         logger.warning("No se extrajeron estudiantes")
     
-    # Cargar estudiantes con upsert
+    # Cargar estudiantes con upsert (solo filas cuyo contenido cambió)
     if not df_es_final.empty:
-        logger.info(f"Cargando {len(df_es_final)} estudiantes con UPSERT...")
-        try:
-            load("estudiantes", df_es_final, upsert=True, pk_column="codigo_estudiante")
-            logger.info(f"✓ Estudiantes cargados exitosamente: {len(df_es_final)} registros")
-        except Exception as e:
-            logger.error(f"✗ Error al cargar estudiantes: {e}")
-            raise
+        df_es_cambiados, hashes_es = _filter_changed_rows("estudiantes", df_es_final, "codigo_estudiante")
+        if df_es_cambiados.empty:
+            logger.info(f"Estudiantes sin cambios desde la última corrida ({len(df_es_final)} filas), se omite el upsert")
+            _save_hashes("estudiantes", hashes_es)
+        else:
+            logger.info(f"Cargando {len(df_es_cambiados)} de {len(df_es_final)} estudiantes con UPSERT...")
+            try:
+                load("estudiantes", df_es_cambiados, upsert=True, pk_column="codigo_estudiante")
+                logger.info(f"✓ Estudiantes cargados exitosamente: {len(df_es_cambiados)} registros")
+                _save_hashes("estudiantes", hashes_es)
+            except Exception as e:
+                logger.error(f"✗ Error al cargar estudiantes: {e}")
+                raise
     else:
         logger.info("No hay estudiantes para cargar")
 
@@ -109,34 +180,42 @@ def run_pipeline(year=None, month=None):
     
     # ==================== MATRICULAS (FILTRADAS POR FECHA) ====================
     logger.info(f"Procesando hoja Matriculas (filtro: {target_date})")
-    df_matriculas_pi_raw = extract_sheet_pi_2(
-        os.getenv("Matricula_PI_ID"),
-        os.getenv("WORKSHEET_MATRICULAS"),
-        None,
-        None,
-    )
+    df_matriculas_pi_raw = raws["matriculas"]
     if not df_matriculas_pi_raw.empty:
         # Filtrar en RAW por Marca temporal antes de transformar
         if "Marca temporal" in df_matriculas_pi_raw.columns:
-            df_matriculas_pi_raw["Marca temporal"] = pd.to_datetime(df_matriculas_pi_raw["Marca temporal"], dayfirst=True, errors="coerce")
+            df_matriculas_pi_raw["Marca temporal"] = pd.to_datetime(df_matriculas_pi_raw["Marca temporal"], dayfirst=True, errors="coerce", cache=True)
             total_before = len(df_matriculas_pi_raw)
-            df_matriculas_pi_raw["_fecha_marca"] = df_matriculas_pi_raw["Marca temporal"].dt.strftime("%Y-%m-%d")
-            df_matriculas_pi_raw = df_matriculas_pi_raw.loc[
-                df_matriculas_pi_raw["_fecha_marca"] == target_date
-            ].reset_index(drop=True)
+            # Comparar en espacio datetime con resolución de día (un solo
+            # kernel numpy), sin strftime por fila ni columna temporal
+            mask_fecha = df_matriculas_pi_raw["Marca temporal"].to_numpy("datetime64[D]") == np.datetime64(yesterday, "D")
+            df_matriculas_pi_raw = df_matriculas_pi_raw.loc[mask_fecha].reset_index(drop=True)
             logger.info(f"Matrículas RAW filtradas por Marca temporal: {len(df_matriculas_pi_raw)} de {total_before} (fecha={target_date})")
         else:
             logger.warning("Columna 'Marca temporal' no encontrada en matrículas, no se aplicó filtro de fecha")
-        
+
+        # Parsear una sola vez la fecha que usan ambos transforms de esta
+        # hoja; los transforms detectan el dtype y no re-parsean
+        if "Fecha de pago de la primera cuota" in df_matriculas_pi_raw.columns:
+            df_matriculas_pi_raw["Fecha de pago de la primera cuota"] = pd.to_datetime(
+                df_matriculas_pi_raw["Fecha de pago de la primera cuota"], dayfirst=True, errors="coerce", cache=True
+            )
+
         df_matriculas_pi_final = transform_matriculas(df_matriculas_pi_raw)
         df_primera_cuota_pi_final = transform_pagos_primera_cuota(df_matriculas_pi_raw)
-        
+
+        # Conjunto de matrículas válidas: se calcula una sola vez y se
+        # reutiliza también en la consolidación de pagos regulares
+        if not df_matriculas_pi_final.empty:
+            # pd.Index como lado derecho del isin: hashmap en C, sin pasar
+            # por un set de Python; las columnas ya vienen en dtype "string"
+            codigos_matriculas_validas = pd.Index(df_matriculas_pi_final["codigo_matricula"].dropna().unique())
+
         # Filtrar pagos de primera cuota para excluir los de matrículas descartadas
         if not df_matriculas_pi_final.empty and not df_primera_cuota_pi_final.empty:
-            codigos_matriculas_validas = set(df_matriculas_pi_final["codigo_matricula"].dropna().astype(str).unique())
             total_pagos_antes = len(df_primera_cuota_pi_final)
             df_primera_cuota_pi_final = df_primera_cuota_pi_final[
-                df_primera_cuota_pi_final["codigo_matricula"].astype(str).isin(codigos_matriculas_validas)
+                df_primera_cuota_pi_final["codigo_matricula"].isin(codigos_matriculas_validas)
             ].reset_index(drop=True)
             excluidos = total_pagos_antes - len(df_primera_cuota_pi_final)
             if excluidos > 0:
@@ -148,7 +227,10 @@ def run_pipeline(year=None, month=None):
     if not df_matriculas_pi_final.empty:
         logger.info(f"Cargando {len(df_matriculas_pi_final)} matrículas del {target_date}...")
         try:
-            load("matriculas", df_matriculas_pi_final, pk_column="codigo_matricula", upsert=False)
+            # El maestro de estudiantes ya está en memoria: evitar que load()
+            # vuelva a bajar las claves por HTTP para validar la FK
+            known = {"codigo_estudiante": set(df_es_final["codigo_estudiante"].dropna())} if not df_es_final.empty else None
+            load("matriculas", df_matriculas_pi_final, pk_column="codigo_matricula", upsert=False, known_keys=known)
             logger.info(f"✓ Matrículas cargadas exitosamente: {len(df_matriculas_pi_final)} registros")
         except Exception as e:
             logger.error(f"✗ Error al cargar matrículas: {e}")
@@ -158,25 +240,27 @@ def run_pipeline(year=None, month=None):
 
     # ==================== PAGOS REGULARES (FILTRADOS POR FECHA) ====================
     logger.info(f"Procesando hoja Regular Pagos (filtro: {target_date})")
-    df_regular_pagos_raw = extract_sheet_pi_3(
-        os.getenv("Matricula_PI_ID"),
-        os.getenv("WORKSHEET_PAGOS"),
-        None,
-        None,
-    )
+    df_regular_pagos_raw = raws["pagos"]
     if not df_regular_pagos_raw.empty:
         # Filtrar en RAW por Marca temporal antes de transformar
         if "Marca temporal" in df_regular_pagos_raw.columns:
-            df_regular_pagos_raw["Marca temporal"] = pd.to_datetime(df_regular_pagos_raw["Marca temporal"], dayfirst=True, errors="coerce")
+            df_regular_pagos_raw["Marca temporal"] = pd.to_datetime(df_regular_pagos_raw["Marca temporal"], dayfirst=True, errors="coerce", cache=True)
+            total_before = len(df_regular_pagos_raw)
+            mask_fecha = df_regular_pagos_raw["Marca temporal"].to_numpy("datetime64[D]") == np.datetime64(yesterday, "D")
+            df_regular_pagos_raw = df_regular_pagos_raw.loc[mask_fecha].reset_index(drop=True)
+            logger.info(f"Pagos regulares RAW filtrados por Marca temporal: {len(df_regular_pagos_raw)} de {total_before} (fecha={target_date})")
+        elif "Fecha de pago" in df_regular_pagos_raw.columns:
+            # Fallback: empujar el predicado de fecha sobre la columna cruda
+            # de pago para no transformar filas que igual se descartarían
+            fechas = pd.to_datetime(df_regular_pagos_raw["Fecha de pago"], dayfirst=True, errors="coerce", cache=True)
             total_before = len(df_regular_pagos_raw)
-            df_regular_pagos_raw["_fecha_marca"] = df_regular_pagos_raw["Marca temporal"].dt.strftime("%Y-%m-%d")
             df_regular_pagos_raw = df_regular_pagos_raw.loc[
-                df_regular_pagos_raw["_fecha_marca"] == target_date
+                fechas.to_numpy("datetime64[D]") == np.datetime64(yesterday, "D")
             ].reset_index(drop=True)
-            logger.info(f"Pagos regulares RAW filtrados por Marca temporal: {len(df_regular_pagos_raw)} de {total_before} (fecha={target_date})")
+            logger.info(f"Pagos regulares RAW filtrados por Fecha de pago: {len(df_regular_pagos_raw)} de {total_before} (fecha={target_date})")
         else:
-            logger.warning("Columna 'Marca temporal' no encontrada en pagos regulares, no se aplicó filtro de fecha")
-        
+            logger.warning("Columnas 'Marca temporal' y 'Fecha de pago' no encontradas en pagos regulares, no se aplicó filtro de fecha")
+
         df_regular_pagos_final = transform_regular_pagos(df_regular_pagos_raw)
     else:
         logger.warning("No se extrajeron pagos regulares")
@@ -184,17 +268,15 @@ def run_pipeline(year=None, month=None):
     # ==================== CONSOLIDACIÓN Y CARGA DE PAGOS ====================
     logger.info(f"Consolidando pagos (primera cuota + regulares) para {target_date}")
     
-    # Obtener conjunto de códigos de matrícula válidos para filtrar pagos
-    codigos_matriculas_validas = set()
-    if not df_matriculas_pi_final.empty:
-        codigos_matriculas_validas = set(df_matriculas_pi_final["codigo_matricula"].dropna().astype(str).unique())
+    # Reutilizar el conjunto de códigos válidos calculado tras la transformación
+    if len(codigos_matriculas_validas):
         logger.info(f"Códigos de matrículas válidas para referencia FK: {len(codigos_matriculas_validas)}")
-    
+
     # Filtrar pagos regulares para excluir los de matrículas no válidas
-    if not df_regular_pagos_final.empty and codigos_matriculas_validas:
+    if not df_regular_pagos_final.empty and len(codigos_matriculas_validas):
         total_pagos_regulares_antes = len(df_regular_pagos_final)
         df_regular_pagos_final = df_regular_pagos_final[
-            df_regular_pagos_final["codigo_matricula"].astype(str).isin(codigos_matriculas_validas)
+            df_regular_pagos_final["codigo_matricula"].isin(codigos_matriculas_validas)
         ].reset_index(drop=True)
         excluidos_regulares = total_pagos_regulares_antes - len(df_regular_pagos_final)
         if excluidos_regulares > 0:
@@ -219,7 +301,11 @@ def run_pipeline(year=None, month=None):
     if not df_regular_pagos_final.empty:
         dataframes_to_concat.append(df_regular_pagos_final)
     
-    if dataframes_to_concat:
+    if len(dataframes_to_concat) == 1:
+        # Caso común (solo una fuente de pagos en el día): reutilizar el
+        # DataFrame directamente, pd.concat copiaría aun con un solo operando
+        df_final_pagos = dataframes_to_concat[0]
+    elif dataframes_to_concat:
         df_final_pagos = pd.concat(dataframes_to_concat, ignore_index=True)
     else:
         # Si ambos están vacíos, crear un DataFrame vacío con las columnas esperadas
@@ -230,7 +316,16 @@ def run_pipeline(year=None, month=None):
     if not df_final_pagos.empty:
         logger.info(f"Cargando {len(df_final_pagos)} pagos del {target_date}...")
         try:
-            load("pagos", df_final_pagos, upsert=False)
+            # Keyset completo de matrículas (una sola descarga paginada) más
+            # las insertadas en esta corrida: la FK de pagos se valida en
+            # memoria en vez del loop de consultas por chunks
+            known_pagos = None
+            matriculas_existentes = fetch_column_values("matriculas", "codigo_matricula")
+            if matriculas_existentes is not None:
+                if not df_matriculas_pi_final.empty:
+                    matriculas_existentes |= set(df_matriculas_pi_final["codigo_matricula"].dropna())
+                known_pagos = {"codigo_matricula": matriculas_existentes}
+            load("pagos", df_final_pagos, upsert=False, known_keys=known_pagos)
             logger.info(f"✓ Pagos cargados exitosamente: {len(df_final_pagos)} registros")
         except Exception as e:
             logger.error(f"✗ Error al cargar pagos: {e}")
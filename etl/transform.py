@@ -1,9 +1,84 @@
+import logging
+
+import numpy as np
 import pandas as pd
 import re
 from logger import get_logger
 
 logger = get_logger("TRANSFORM")
 
+# =========================
+# NORMALIZADOR DE CUENTAS
+# =========================
+# Mapas a nivel de módulo: se construyen una sola vez, no en cada llamada
+ACCOUNT_MAP_PRIMERA_CUOTA = {
+    "BANCO DE LA NACIÓN": "Banco de la Nación",
+    "SCOTIABANK": "Scotiabank",
+    "INTERBANK": "Interbank",
+    "YAPE": "Yape",
+    "PLIN": "Plin",
+    "BBVA": "BBVA",
+    "BCP": "BCP",
+    "TARJETA LINK": "Tarjeta LINK",
+    "PAYPAL": "Paypal",
+    "BANCO DE MÉXICO": "Banco de México",
+    "BANCO DE MEXICO": "Banco de México",
+    "BANCO DE ECUADOR": "Banco de Ecuador",
+    "BANCO DE COLOMBIA": "Banco de Colombia",
+    "BANCO DE CHILE": "Banco de Chile",
+    "OTROS": "Sin Especificar",
+}
+
+ACCOUNT_MAP_REGULAR = {
+    **ACCOUNT_MAP_PRIMERA_CUOTA,
+    "BANCO DE ECUADOR / P": "Banco de Ecuador",
+    "BANCO DE MÉXICO / P": "Banco de México",
+}
+
+# Moneda por método de pago, claves en mayúsculas (mismo criterio que el
+# viejo currency_fixed pero sobre la clave normalizada, no el valor crudo)
+CURRENCY_MAP = {
+    "BANCO DE MÉXICO": "MXN",
+    "BANCO DE MEXICO": "MXN",
+    "BANCO DE MÉXICO / P": "MXN",
+    "BANCO DE ECUADOR / P": "MXN",
+    "BANCO DE ECUADOR": "USD",
+    "PAYPAL": "USD",
+    "BANCO DE CHILE": "CLP",
+}
+
+# Clasificación de país por prefijo telefónico en una sola pasada: la
+# alternancia prueba los prefijos más largos primero (mismo orden de
+# prioridad que la tabla original) y el mapa resuelve el nombre
+_NON_DIGIT_RE = re.compile(r"\D")
+_PHONE_PREFIX_RE = re.compile(r"^(549|569|593|591|507|51|57|52|55|39|34|33|49)")
+_PHONE_PREFIX_COUNTRY = {
+    "549": "Argentina",
+    "569": "Chile",
+    "51": "Perú",
+    "57": "Colombia",
+    "593": "Ecuador",
+    "591": "Bolivia",
+    "507": "Panamá",
+    "52": "México",
+    "55": "Brasil",
+    "39": "Italia",
+    "34": "España",
+    "33": "Francia",
+    "49": "Alemania",
+}
+
+
+def _fast_iso_date(series):
+    """Formatea una columna datetime a 'YYYY-MM-DD' por la vía numpy
+    (datetime_as_string), sin el strftime por elemento de pandas.
+    Los NaT salen como None."""
+    arr = series.to_numpy(dtype="datetime64[ns]")
+    out = pd.Series(np.datetime_as_string(arr, unit="D"), index=series.index, dtype=object)
+    out.loc[series.isna()] = None
+    return out
+
+
 def transform_cursos(df):
     logger.info("Transformando hoja de cursos Peri Institute")
 
@@ -13,29 +88,30 @@ def transform_cursos(df):
     # Asegurar que columnas de fecha estén en formato datetime
     date_cols = ["FECHA DE INICIO", "FECHA DE TERMINO", "fecha"]
     for c in date_cols:
-        if c in df.columns:
-            df[c] = pd.to_datetime(df[c], dayfirst=True, errors="coerce")
-            n_null = int(df[c].isna().sum())
-            logger.info(f"Columna '{c}' convertida a datetime; nulos: {n_null}")
-    def extraer_codigo(value):
-        return value.split(" ", 1)[0]
-
+        if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = pd.to_datetime(df[c], dayfirst=True, errors="coerce", cache=True)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Columna '{c}' convertida a datetime; nulos: {int(df[c].isna().sum())}")
     # =================
     df_transformed = pd.DataFrame({
-        "codigo_curso": df["CÓDIGO_C"].astype(str),
-        "nombre_curso": df["NOMBRE_C"].astype(str),
+        "codigo_curso": df["CÓDIGO_C"].astype("string"),
+        "nombre_curso": df["NOMBRE_C"].astype("string"),
         "numero_modulo": df["I1"].astype(int),
-        "fecha_inicio": df["FECHA DE INICIO"].dt.strftime("%Y-%m-%d"),
-        "codigo_profesor": df["PROFESOR"].apply(extraer_codigo).astype(str),
-        "horarios": df["HORARIOS"].astype(str),
+        "fecha_inicio": _fast_iso_date(df["FECHA DE INICIO"]),
+        # primer token del campo profesor, vectorizado (sin lambda por fila)
+        "codigo_profesor": df["PROFESOR"].astype("string").str.split(" ", n=1).str[0],
+        "horarios": df["HORARIOS"].astype("string"),
     })
-    # Eliminar duplicados por PK en la capa de transformación si aparecen
+    # Eliminar duplicados por PK en la capa de transformación si aparecen.
+    # drop_duplicates primero; las claves ofensoras solo se recalculan en el
+    # caso raro de que efectivamente hubiera duplicados (una pasada en vez de dos)
     if "codigo_curso" in df_transformed.columns:
-        dup_mask = df_transformed.duplicated(subset=["codigo_curso"], keep=False)
-        if dup_mask.any():
-            dup_vals = df_transformed.loc[dup_mask, "codigo_curso"].unique().tolist()
+        n_before = len(df_transformed)
+        df_dedup = df_transformed.drop_duplicates(subset=["codigo_curso"], keep="last").reset_index(drop=True)
+        if len(df_dedup) != n_before:
+            dup_vals = df_transformed["codigo_curso"][df_transformed["codigo_curso"].duplicated(keep=False)].unique().tolist()
             logger.warning(f"Duplicados detectados en transform_cursos para 'codigo_curso': {dup_vals}. Se eliminarán duplicados manteniendo la última fila.")
-            df_transformed = df_transformed.drop_duplicates(subset=["codigo_curso"], keep="last").reset_index(drop=True)
+            df_transformed = df_dedup
     logger.info(
         f"Registros transformados correctamente: {len(df_transformed)}"
     )
@@ -43,10 +119,8 @@ def transform_cursos(df):
     # =========================
     # SAMPLE DE DATOS
     # =========================
-    logger.info("Sample de registros transformados:")
-    logger.info(
-        "\n" + df_transformed.head(15).to_string(index=False)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sample de registros transformados:\n%s", df_transformed.head(15).to_string(index=False))
 
     return df_transformed
 
@@ -60,63 +134,47 @@ def transform_matriculas(df):
         logger.warning("DataFrame vacío, no hay datos para transformar")
         return df
     # Asegurar columnas de fecha como datetime
+    # El pipeline ya entrega estas columnas parseadas; solo convertir lo que
+    # aún venga como texto (p.ej. si el transform se usa suelto)
     for c in ["Marca temporal", "Fecha de pago de la primera cuota", "Fecha de pago"]:
-        if c in df.columns:
-            df[c] = pd.to_datetime(df[c], dayfirst=True, errors="coerce")
-            n_null = int(df[c].isna().sum())
-            logger.info(f"Columna '{c}' convertida a datetime; nulos: {n_null}")
-    def extraer_codigo_proyecto(valor):
-        if valor is None or (isinstance(valor, float) and pd.isna(valor)):
-            return valor
-
-        texto = str(valor).strip()
-
-        # Solo transformar si empieza con P
-        if texto.startswith("P"):
-            return texto.split(" ", 1)[0]
-
-        return texto
-
-
-    def normalizar_num_cursos(curso_matricula, num_cursos):
-        # Manejo de nulos
-        if curso_matricula is None or (isinstance(curso_matricula, float) and pd.isna(curso_matricula)):
-            return 0
-
-        texto = str(curso_matricula).strip()
-
-        # Si empieza con P, se respeta el valor original
-        if texto.startswith("P"):
-            return num_cursos
-
-        return 0
-
-
-    
+        if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = pd.to_datetime(df[c], dayfirst=True, errors="coerce", cache=True)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Columna '{c}' convertida a datetime; nulos: {int(df[c].isna().sum())}")
+    # Código de curso y num_cursos vectorizados sobre la misma máscara: los
+    # proyectos ('P...') toman su primer token y respetan num cursos; el
+    # resto pasa tal cual con num_cursos en 0
+    s_cursos = df["Cursos de matrícula"].astype("string").str.strip()
+    mask_p_cursos = s_cursos.str.startswith("P", na=False)
+    codigo_curso_col = s_cursos.where(~mask_p_cursos, s_cursos.str.split(" ", n=1).str[0])
+    num_raw = pd.to_numeric(df["num cursos"], errors="coerce").fillna(0)
+    num_cursos_col = np.where(mask_p_cursos.to_numpy(), num_raw.to_numpy(), 0).astype(int)
 
     # Usar explícitamente 'Fecha de pago de la primera cuota' como fecha de matrícula.
     # Si no existe la columna, dejar como NA.
     if "Fecha de pago de la primera cuota" in df.columns:
-        fecha_matricula_col = df["Fecha de pago de la primera cuota"].dt.strftime("%Y-%m-%d")
+        fecha_matricula_col = _fast_iso_date(df["Fecha de pago de la primera cuota"])
     else:
         fecha_matricula_col = pd.Series([pd.NA] * len(df))
 
     df_transformed = pd.DataFrame({
-        "codigo_matricula": df["Código de matrícula"].astype(str),
-        "codigo_curso": df["Cursos de matrícula"].apply(extraer_codigo_proyecto).astype(str),
-        "num_cursos": df.apply(lambda row: normalizar_num_cursos(row["Cursos de matrícula"], row["num cursos"]), axis=1).astype(int),
+        "codigo_matricula": df["Código de matrícula"].astype("string"),
+        "codigo_curso": codigo_curso_col,
+        "num_cursos": num_cursos_col,
         "fecha_matricula": fecha_matricula_col,
-        "condicion_alumno": df["Condición del alumno"].astype(str),
-        "codigo_estudiante": df["Código de estudiante FINAL"].astype(str),
+        "condicion_alumno": df["Condición del alumno"].astype("string"),
+        "codigo_estudiante": df["Código de estudiante FINAL"].astype("string"),
         "valor_matricula": pd.to_numeric(df["Monto de Pago"], errors="coerce").fillna(0).round(2)
     })
     # Eliminar duplicados por PK en la capa de transformación si aparecen
+    # (drop_duplicates primero; las claves solo se recalculan si hubo duplicados)
     if "codigo_matricula" in df_transformed.columns:
-        dup_mask = df_transformed.duplicated(subset=["codigo_matricula"], keep=False)
-        if dup_mask.any():
-            dup_vals = df_transformed.loc[dup_mask, "codigo_matricula"].unique().tolist()
+        n_before = len(df_transformed)
+        df_dedup = df_transformed.drop_duplicates(subset=["codigo_matricula"], keep="last").reset_index(drop=True)
+        if len(df_dedup) != n_before:
+            dup_vals = df_transformed["codigo_matricula"][df_transformed["codigo_matricula"].duplicated(keep=False)].unique().tolist()
             logger.warning(f"Duplicados detectados en transform_matriculas para 'codigo_matricula': {dup_vals}. Se eliminarán duplicados manteniendo la última fila.")
-            df_transformed = df_transformed.drop_duplicates(subset=["codigo_matricula"], keep="last").reset_index(drop=True)
+            df_transformed = df_dedup
 
     # Filtrar filas cuyo codigo_curso no comienza con 'P' (no son proyectos) — no las incluimos en la carga
     if "codigo_curso" in df_transformed.columns:
@@ -132,10 +190,8 @@ def transform_matriculas(df):
     # =========================
     # SAMPLE DE DATOS
     # =========================
-    logger.info("Sample de registros transformados:")
-    logger.info(
-        "\n" + df_transformed.head(15).to_string(index=False)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sample de registros transformados:\n%s", df_transformed.head(15).to_string(index=False))
 
     return df_transformed
 
@@ -145,45 +201,25 @@ def transform_pagos_primera_cuota(df):
     if df.empty:
         logger.warning("DataFrame vacío, no hay datos para transformar")
         return df
-    # Convertir fecha de primera cuota a datetime
-    if "Fecha de pago de la primera cuota" in df.columns:
-        df["Fecha de pago de la primera cuota"] = pd.to_datetime(df["Fecha de pago de la primera cuota"], dayfirst=True, errors="coerce")
-        n_null = int(df["Fecha de pago de la primera cuota"].isna().sum())
-        logger.info(f"Columna 'Fecha de pago de la primera cuota' convertida a datetime; nulos: {n_null}")
-     # =========================
-    # NORMALIZADOR DE CUENTAS
-    # =========================
-    ACCOUNT_MAP = {
-    "BANCO DE LA NACIÓN": "Banco de la Nación",
-    "SCOTIABANK": "Scotiabank",
-    "INTERBANK": "Interbank",
-    "YAPE": "Yape",
-    "PLIN": "Plin",
-    "BBVA": "BBVA",
-    "BCP": "BCP",
-    "TARJETA LINK": "Tarjeta LINK",
-    "PAYPAL": "Paypal",
-    "BANCO DE MÉXICO": "Banco de México",
-    "BANCO DE MEXICO": "Banco de México",
-    "BANCO DE ECUADOR": "Banco de Ecuador",
-    "BANCO DE COLOMBIA": "Banco de Colombia",
-    "BANCO DE CHILE": "Banco de Chile",
-    "OTROS": "Sin Especificar"
-    }
-    def normalize_account(value):
-        if not value:
-            return None
-
-        key = str(value).strip().upper()
-        return ACCOUNT_MAP.get(key, value.title())
+    # Convertir fecha de primera cuota a datetime (si no llegó ya parseada)
+    if "Fecha de pago de la primera cuota" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["Fecha de pago de la primera cuota"]):
+        df["Fecha de pago de la primera cuota"] = pd.to_datetime(df["Fecha de pago de la primera cuota"], dayfirst=True, errors="coerce", cache=True)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Columna 'Fecha de pago de la primera cuota' convertida a datetime; nulos: {int(df['Fecha de pago de la primera cuota'].isna().sum())}")
+    # Normalización vectorizada: lookup en el mapa por la clave en mayúsculas
+    # y title-case como fallback, sin llamada Python por fila
+    metodo_raw = df["Método de Pago"].astype("string")
+    metodo_key = metodo_raw.str.strip().str.upper()
+    metodo_pago = metodo_key.map(ACCOUNT_MAP_PRIMERA_CUOTA).fillna(metodo_raw.str.title()).astype(object)
+    metodo_pago.loc[metodo_key.isna() | (metodo_key == "")] = None
 
     df_transformed = pd.DataFrame({
-        "codigo_matricula": df["Código de matrícula"].astype(str),
+        "codigo_matricula": df["Código de matrícula"].astype("string"),
         "monto_pago": pd.to_numeric(df["Primera Cuota"], errors="coerce").fillna(0).round(2),
-        "metodo_pago": df["Método de Pago"].apply(normalize_account),
-        "moneda": df["Moneda"].astype(str),
-        "encargado": df["Encargado de Registro"].astype(str),
-        "fecha_pago": df["Fecha de pago de la primera cuota"].dt.strftime("%Y-%m-%d"),
+        "metodo_pago": metodo_pago,
+        "moneda": df["Moneda"].astype("string"),
+        "encargado": df["Encargado de Registro"].astype("string"),
+        "fecha_pago": _fast_iso_date(df["Fecha de pago de la primera cuota"]),
         
     })
     logger.info(
@@ -193,10 +229,8 @@ def transform_pagos_primera_cuota(df):
     # =========================
     # SAMPLE DE DATOS
     # =========================
-    logger.info("Sample de registros transformados:")
-    logger.info(
-        "\n" + df_transformed.head(15).to_string(index=False)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sample de registros transformados:\n%s", df_transformed.head(15).to_string(index=False))
 
     return df_transformed
 
@@ -209,61 +243,26 @@ def transform_regular_pagos(df):
         logger.warning("DataFrame vacío, no hay datos para transformar")
         return df
 
-    # Asegurar columnas de fecha como datetime
-    if "Fecha de pago" in df.columns:
-        df["Fecha de pago"] = pd.to_datetime(df["Fecha de pago"], dayfirst=True, errors="coerce")
-        n_null = int(df["Fecha de pago"].isna().sum())
-        logger.info(f"Columna 'Fecha de pago' convertida a datetime; nulos: {n_null}")
-
-    # =========================
-    # NORMALIZADOR DE CUENTAS
-    # =========================
-    ACCOUNT_MAP = {
-    "BANCO DE LA NACIÓN": "Banco de la Nación",
-    "SCOTIABANK": "Scotiabank",
-    "INTERBANK": "Interbank",
-    "YAPE": "Yape",
-    "PLIN": "Plin",
-    "BBVA": "BBVA",
-    "BCP": "BCP",
-    "TARJETA LINK": "Tarjeta LINK",
-    "PAYPAL": "Paypal",
-    "BANCO DE MÉXICO": "Banco de México",
-    "BANCO DE ECUADOR / P": "Banco de Ecuador",
-    "BANCO DE MEXICO": "Banco de México",
-    "BANCO DE MÉXICO / P": "Banco de México",
-    "BANCO DE ECUADOR": "Banco de Ecuador",
-    "BANCO DE COLOMBIA": "Banco de Colombia",
-    "BANCO DE CHILE": "Banco de Chile",
-    "OTROS": "Sin Especificar"
-    }
-
-
-    def normalize_account(value):
-        if not value:
-            return None
-
-        key = str(value).strip().upper()
-        return ACCOUNT_MAP.get(key, value.title())
-    def currency_fixed(value):
-        if value == "Banco de México" or value == "Banco de Mexico" or value == "Banco de México / P" or value == "Banco de Ecuador / P":
-            return "MXN"
-        elif value == "Banco de Ecuador" or value == "PAYPAL" or value == "Paypal":
-            return "USD"
-        elif value == "Banco de Chile":
-            return "CLP"
-        else:
-            return "PEN"
+    # Asegurar columnas de fecha como datetime (si no llegaron ya parseadas)
+    if "Fecha de pago" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["Fecha de pago"]):
+        df["Fecha de pago"] = pd.to_datetime(df["Fecha de pago"], dayfirst=True, errors="coerce", cache=True)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Columna 'Fecha de pago' convertida a datetime; nulos: {int(df['Fecha de pago'].isna().sum())}")
 
-    
+    # Normalización vectorizada: lookup en el mapa por la clave en mayúsculas
+    # y title-case como fallback, sin llamada Python por fila
+    metodo_raw = df["Método de Pago"].astype("string")
+    metodo_key = metodo_raw.str.strip().str.upper()
+    metodo_pago = metodo_key.map(ACCOUNT_MAP_REGULAR).fillna(metodo_raw.str.title()).astype(object)
+    metodo_pago.loc[metodo_key.isna() | (metodo_key == "")] = None
 
     df_transformed = pd.DataFrame({
-        "codigo_matricula": df["Código de matrícula"].astype(str),
+        "codigo_matricula": df["Código de matrícula"].astype("string"),
         "monto_pago": pd.to_numeric(df["Monto de Pago"], errors="coerce").fillna(0).round(2),
-        "metodo_pago": df["Método de Pago"].apply(normalize_account),
-        "moneda": df["Método de Pago"].apply(currency_fixed).astype(str),
-        "encargado": df["Encargado de Registro"].astype(str),
-        "fecha_pago": df["Fecha de pago"].dt.strftime("%Y-%m-%d"),
+        "metodo_pago": metodo_pago,
+        "moneda": metodo_key.map(CURRENCY_MAP).fillna("PEN"),
+        "encargado": df["Encargado de Registro"].astype("string"),
+        "fecha_pago": _fast_iso_date(df["Fecha de pago"]),
     })
     logger.info(
         f"Registros transformados correctamente: {len(df_transformed)}"
@@ -272,10 +271,8 @@ def transform_regular_pagos(df):
     # =========================
     # SAMPLE DE DATOS
     # =========================
-    logger.info("Sample de registros transformados:")
-    logger.info(
-        "\n" + df_transformed.head(15).to_string(index=False)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sample de registros transformados:\n%s", df_transformed.head(15).to_string(index=False))
 
     return df_transformed
 
@@ -288,69 +285,26 @@ def transform_estudiantes(df):
         return df
     
 
-    def detectar_pais_telefono(value):
-        if value is None:
-            return {
-                "pais": "Desconocido",
-                "codigo_pais": None,
-                "numero_e164": None
-            }
-
-        # 1️⃣ Normalizar: solo dígitos
-        num = re.sub(r"\D", "", str(value))
-
-        # 2️⃣ Tabla de prefijos (orden importa: más largos primero)
-        paises = [
-            # América Latina
-            ("Argentina", "54", lambda n: n.startswith("549")),
-            ("Chile", "56", lambda n: n.startswith("569")),
-            ("Perú", "51", lambda n: n.startswith("51")),
-            ("Colombia", "57", lambda n: n.startswith("57")),
-            ("Ecuador", "593", lambda n: n.startswith("593")),
-            ("Bolivia", "591", lambda n: n.startswith("591")),
-            ("Panamá", "507", lambda n: n.startswith("507")),
-            ("México", "52", lambda n: n.startswith("521") or n.startswith("52")),
-            ("Brasil", "55", lambda n: n.startswith("55")),
-
-            # Estados Unidos / territorios
-            ("Estados Unidos / Puerto Rico", "1", lambda n: len(n) == 11 and n.startswith("1")),
-
-            # Europa
-            ("Italia", "39", lambda n: n.startswith("39")),
-            ("España", "34", lambda n: n.startswith("34")),
-            ("Francia", "33", lambda n: n.startswith("33")),
-            ("Alemania", "49", lambda n: n.startswith("49")),
-        ]
-
-        # 3️⃣ Detección
-        for pais, cod, regla in paises:
-            if regla(num):
-                return {
-                    "pais": pais,
-                    "codigo_pais": cod,
-                    "numero_e164": f"+{num}"
-                }
-
-        # 4️⃣ Fallback
-        return {
-            "pais": "Desconocido",
-            "codigo_pais": None,
-            "numero_e164": f"+{num}" if num else None
-        }
-    # Expandir la información de país/número en un DataFrame temporal
-    phone_info = df["NUMERO_E"].apply(detectar_pais_telefono).apply(pd.Series)
+    # Detección de país vectorizada: normalizar a solo dígitos y clasificar
+    # el prefijo en una única pasada de regex (str.extract) más un lookup,
+    # en vez de 14 máscaras startswith encadenadas
+    num = df["NUMERO_E"].astype("string").str.replace(_NON_DIGIT_RE, "", regex=True).fillna("")
+    pais_col = num.str.extract(_PHONE_PREFIX_RE, expand=False).map(_PHONE_PREFIX_COUNTRY).astype(object)
+    # Estados Unidos / territorios: 11 dígitos comenzando en 1
+    mask_us = pais_col.isna() & (num.str.len() == 11) & num.str.startswith("1")
+    pais_col.loc[mask_us] = "Estados Unidos / Puerto Rico"
+    pais_col.loc[pais_col.isna()] = "Desconocido"
 
     df_transformed = pd.DataFrame({
-        "codigo_estudiante": df["CODIGO_E"].astype(str),
-        "nombres": df["NOMBRES_E"].astype(str).str.strip().str.title(),
-        "apellidos": df["APELLIDOS_E"].astype(str).str.strip().str.title(),
-        "correo": df["CORREO_E"].astype(str).str.strip().str.lower(),
-        "numero": df["NUMERO_E"].astype(str).str.strip(),
-        # expand country info from phone
-        "pais": phone_info["pais"],
-        "genero": df["GÉNERO_E"].astype(str),
-        "red_contacto": df["RED DE CONTACTO_E"].astype(str),
-        "nivel_educacion": df["GRADO DE INSTRUCCIÓN_E"].astype(str)
+        "codigo_estudiante": df["CODIGO_E"].astype("string"),
+        "nombres": df["NOMBRES_E"].astype("string").str.strip().str.title(),
+        "apellidos": df["APELLIDOS_E"].astype("string").str.strip().str.title(),
+        "correo": df["CORREO_E"].astype("string").str.strip().str.lower(),
+        "numero": df["NUMERO_E"].astype("string").str.strip(),
+        "pais": pais_col,
+        "genero": df["GÉNERO_E"].astype("string"),
+        "red_contacto": df["RED DE CONTACTO_E"].astype("string"),
+        "nivel_educacion": df["GRADO DE INSTRUCCIÓN_E"].astype("string")
     })
     logger.info(
         f"Registros transformados correctamente: {len(df_transformed)}"
@@ -359,10 +313,8 @@ def transform_estudiantes(df):
     # =========================
     # SAMPLE DE DATOS
     # =========================
-    logger.info("Sample de registros transformados:")
-    logger.info(
-        "\n" + df_transformed.head(15).to_string(index=False)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sample de registros transformados:\n%s", df_transformed.head(15).to_string(index=False))
 
     return df_transformed
 